@@ -7,18 +7,17 @@ Detects the Linux distribution and installs required packages.
 """
 
 import argparse
+import functools
 import multiprocessing
 import os
+import platform
 import shutil
 import subprocess
 import sys
-import tarfile
-import urllib.request
-from pathlib import Path
 
 DEPENDENCIES = {
     "debian": {
-        "packages": [
+        "packages": (
             # === Core Build Tools ===
             "build-essential",
             "gcc",
@@ -44,12 +43,12 @@ DEPENDENCIES = {
             "pandoc",
             "asciidoctor",
             "texinfo",
-        ],
-        "update_cmd": ["apt-get", "update"],
-        "install_cmd": ["apt-get", "install", "-y"],
+        ),
+        "update_cmd": ("apt-get", "update"),
+        "install_cmd": ("apt-get", "install", "-y"),
     },
     "fedora": {
-        "packages": [
+        "packages": (
             # === Core Build Tools ===
             "gcc",
             "gcc-c++",
@@ -79,12 +78,12 @@ DEPENDENCIES = {
             "pandoc",
             "asciidoctor",
             "texinfo",
-        ],
+        ),
         "update_cmd": None,
-        "install_cmd": ["dnf", "install", "-y"],
+        "install_cmd": ("dnf", "install", "-y"),
     },
     "arch": {
-        "packages": [
+        "packages": (
             # === Core Build Tools ===
             "base-devel",
             "gcc",
@@ -113,12 +112,12 @@ DEPENDENCIES = {
             "pandoc",
             "asciidoctor",
             "texinfo",
-        ],
-        "update_cmd": ["pacman", "-Syu", "--noconfirm"],
-        "install_cmd": ["pacman", "-S", "--noconfirm"],
+        ),
+        "update_cmd": ("pacman", "-Syu", "--noconfirm"),
+        "install_cmd": ("pacman", "-S", "--noconfirm"),
     },
     "suse": {
-        "packages": [
+        "packages": (
             # === Core Build Tools ===
             "gcc",
             "gcc-c++",
@@ -148,12 +147,12 @@ DEPENDENCIES = {
             "pandoc",
             "asciidoctor",
             "texinfo",
-        ],
+        ),
         "update_cmd": None,
-        "install_cmd": ["zypper", "install", "-y"],
+        "install_cmd": ("zypper", "install", "-y"),
     },
     "alpine": {
-        "packages": [
+        "packages": (
             # === Core Build Tools ===
             "build-base",
             "gcc",
@@ -182,75 +181,100 @@ DEPENDENCIES = {
             "pandoc",
             "asciidoctor",
             "texinfo",
-        ],
-        "update_cmd": ["apk", "update"],
-        "install_cmd": ["apk", "add"],
+        ),
+        "update_cmd": ("apk", "update"),
+        "install_cmd": ("apk", "add"),
     },
 }
 
+DISTRO_CHOICES = tuple(DEPENDENCIES)
+
+# Map os-release ID / ID_LIKE values onto the families above
+OS_RELEASE_FAMILIES = {
+    "debian": "debian",
+    "ubuntu": "debian",
+    "linuxmint": "debian",
+    "pop": "debian",
+    "fedora": "fedora",
+    "rhel": "fedora",
+    "centos": "fedora",
+    "rocky": "fedora",
+    "almalinux": "fedora",
+    "arch": "arch",
+    "manjaro": "arch",
+    "endeavouros": "arch",
+    "suse": "suse",
+    "opensuse": "suse",
+    "opensuse-leap": "suse",
+    "opensuse-tumbleweed": "suse",
+    "sles": "suse",
+    "alpine": "alpine",
+}
+
+# Package managers probed when os-release is missing or unrecognised
+PACKAGE_MANAGERS = (
+    ("apt-get", "debian"),
+    ("dnf", "fedora"),
+    ("yum", "fedora"),
+    ("pacman", "arch"),
+    ("zypper", "suse"),
+    ("apk", "alpine"),
+)
+
 
 def get_cpu_count() -> int:
     """Get number of CPUs for parallel runtime builds."""
     return multiprocessing.cpu_count()
 
 
-def run_command(
-    cmd: list, cwd: str = None, env: dict = None
-) -> subprocess.CompletedProcess:
-    """Run a command with logging."""
-    print(f"$ {' '.join(cmd)}")
-    merged_env = os.environ.copy()
-    if env:
-        merged_env.update(env)
-    return subprocess.run(cmd, cwd=cwd, env=merged_env, check=True)
-
-
-def download_file(url: str, dest: Path):
-    """Download a file if it does not already exist."""
-    if dest.exists():
-        print(f"Already downloaded: {dest.name}")
-        return
-
-    print(f"Downloading: {url}")
-    urllib.request.urlretrieve(url, str(dest))
+def read_os_release() -> dict:
+    """Read os-release(5) into a dict of its key/value pairs."""
+    if hasattr(platform, "freedesktop_os_release"):
+        try:
+            return platform.freedesktop_os_release()
+        except OSError:
+            return {}
 
-
-def extract_archive(archive: Path, dest_dir: Path):
-    """Extract a source archive if needed."""
-    print(f"Extracting: {archive.name}")
-    with tarfile.open(archive) as tar:
-        tar.extractall(str(dest_dir))
+    info = {}
+    try:
+        with open("/etc/os-release") as f:
+            for line in f:
+                key, sep, value = line.strip().partition("=")
+                if sep and not key.startswith("#"):
+                    info[key] = value.strip("\"'")
+    except OSError:
+        pass
+    return info
 
 
+@functools.lru_cache(maxsize=1)
 def detect_distro() -> str:
     """Detect the Linux distribution family."""
+    # Prefer os-release, which names the distribution and its parents
+    release = read_os_release()
+    for name in [release.get("ID", ""), *release.get("ID_LIKE", "").split()]:
+        family = OS_RELEASE_FAMILIES.get(name.lower())
+        if family:
+            return family
+
     # Check for package managers
-    if shutil.which("apt-get"):
-        return "debian"
-    elif shutil.which("dnf"):
-        return "fedora"
-    elif shutil.which("yum"):
-        return "fedora"
-    elif shutil.which("pacman"):
-        return "arch"
-    elif shutil.which("zypper"):
-        return "suse"
-    elif shutil.which("apk"):
-        return "alpine"
-
-    # Fallback: check /etc/os-release
+    for command, family in PACKAGE_MANAGERS:
+        if shutil.which(command):
+            return family
+
+    # Last resort: substring match on the raw os-release bytes
     if os.path.exists("/etc/os-release"):
-        with open("/etc/os-release") as f:
+        with open("/etc/os-release", "rb") as f:
             content = f.read().lower()
-            if "debian" in content or "ubuntu" in content:
+            if b"debian" in content or b"ubuntu" in content:
                 return "debian"
-            elif "fedora" in content or "rhel" in content or "centos" in content:
+            elif b"fedora" in content or b"rhel" in content or b"centos" in content:
                 return "fedora"
-            elif "arch" in content:
+            elif b"arch" in content:
                 return "arch"
-            elif "suse" in content:
+            elif b"suse" in content:
                 return "suse"
-            elif "alpine" in content:
+            elif b"alpine" in content:
                 return "alpine"
 
     return None
@@ -271,7 +295,7 @@ def install_dependencies(
     """
     if distro not in DEPENDENCIES:
         print(f"Error: Unknown distribution: {distro}", file=sys.stderr)
-        print(f"Supported: {', '.join(DEPENDENCIES.keys())}", file=sys.stderr)
+        print(f"Supported: {', '.join(DISTRO_CHOICES)}", file=sys.stderr)
         return 1
 
     config = DEPENDENCIES[distro]
@@ -279,7 +303,7 @@ def install_dependencies(
 
     def run_cmd(cmd):
         if use_sudo and os.geteuid() != 0:
-            cmd = ["sudo"] + cmd
+            cmd = ["sudo", *cmd]
 
         print(f"$ {' '.join(cmd)}")
         if not dry_run:
@@ -293,7 +317,7 @@ def install_dependencies(
             return result
 
     # Install packages
-    install_cmd = config["install_cmd"] + packages
+    install_cmd = [*config["install_cmd"], *packages]
     result = run_cmd(install_cmd)
 
     return result
@@ -308,7 +332,7 @@ def main():
     parser.add_argument(
         "-d",
         "--distro",
-        choices=list(DEPENDENCIES.keys()),
+        choices=DISTRO_CHOICES,
         help="Force specific distribution (auto-detected by default)",
     )
     parser.add_argument(
@@ -7,9 +7,13 @@ Formats C/header files using clang-format and Python/SCons files using ruff.
 """
 
 import argparse
+import concurrent.futures
+import json
 import os
+import shutil
 import subprocess
 import sys
+import tempfile
 from pathlib import Path
 
 
@@ -18,29 +22,79 @@ SOURCE_EXTENSIONS = {".c", ".h"}
 PYTHON_EXTENSIONS = {".py"}
 SCONS_FILENAMES = {"SConstruct", "SConscript"}
 
+# Extensions without the leading dot, for lookups on raw file names
+CLANG_SUFFIXES = frozenset(ext[1:] for ext in SOURCE_EXTENSIONS)
+RUFF_SUFFIXES = frozenset(ext[1:] for ext in PYTHON_EXTENSIONS)
+
 RUFF_CONFIG_PATH = Path(__file__).resolve().parent.parent / "format" / "ruff.toml"
 CLANG_CONFIG_PATH = (
     Path(__file__).resolve().parent.parent / "format" / "clang-format.yaml"
 )
 
+# Stat info of C/header files as of their last successful format or check
+FORMAT_CACHE_PATH = Path(__file__).resolve().parent.parent.parent / (
+    ".clang-format-cache.json"
+)
+
 # Directories to skip
 SKIP_DIRS = {"build", "toolchain", ".git", "__pycache__", "node_modules"}
 
+# Command line budget per formatter invocation, well below the usual ARG_MAX
+MAX_COMMAND_LENGTH = 120000
 
-def classify_file(filepath: str):
-    """Classify a file for clang-format or ruff."""
-    name = Path(filepath).name
-    ext = Path(filepath).suffix.lower()
-    if ext in SOURCE_EXTENSIONS:
+
+def classify_name(name: str):
+    """Classify a bare file name for clang-format or ruff."""
+    stem, _, ext = name.rpartition(".")
+    ext = ext.lower() if stem else ""
+    if ext in CLANG_SUFFIXES:
         return "clang"
-    if ext in PYTHON_EXTENSIONS or name in SCONS_FILENAMES:
+    if ext in RUFF_SUFFIXES or name in SCONS_FILENAMES:
         return "ruff"
     return None
 
 
+def classify_file(filepath: str):
+    """Classify a file for clang-format or ruff."""
+    return classify_name(os.path.basename(filepath))
+
+
+def scan_directory(path: str) -> dict:
+    """Collect supported source files below a single directory.
+
+    Args:
+        path: Directory to search
+
+    Returns:
+        Dict with keys "clang" and "ruff"
+    """
+    files = {"clang": [], "ruff": []}
+    pending = [path]
+
+    while pending:
+        # Like os.walk, skip directories that cannot be read or that vanish
+        # during the scan instead of aborting the whole run
+        try:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in SKIP_DIRS:
+                            pending.append(entry.path)
+                    elif entry.is_file():
+                        kind = classify_name(entry.name)
+                        if kind:
+                            files[kind].append(entry.path)
+        except OSError:
+            continue
+
+    return files
+
+
 def find_source_files(root_dir: str) -> dict:
     """Find all supported source files in a directory tree.
 
+    Top-level subdirectories are scanned concurrently.
+
     Args:
         root_dir: Root directory to search
 
@@ -48,18 +102,127 @@ def find_source_files(root_dir: str) -> dict:
         Dict with keys "clang" and "ruff"
     """
     files = {"clang": [], "ruff": []}
+    subdirs = []
+
+    with os.scandir(root_dir) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in SKIP_DIRS:
+                    subdirs.append(entry.path)
+            elif entry.is_file():
+                kind = classify_name(entry.name)
+                if kind:
+                    files[kind].append(entry.path)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        for found in executor.map(scan_directory, subdirs):
+            files["clang"].extend(found["clang"])
+            files["ruff"].extend(found["ruff"])
 
-    for dirpath, dirnames, filenames in os.walk(root_dir):
-        # Remove directories to skip
-        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+    return files
 
-        for filename in filenames:
-            filepath = os.path.join(dirpath, filename)
-            kind = classify_file(filepath)
-            if kind:
-                files[kind].append(filepath)
 
-    return files
+def chunk_files(files: list, cmd: list) -> list:
+    """Split files into groups that fit on one command line after cmd.
+
+    Args:
+        files: List of file paths
+        cmd: Base command the files will be appended to
+
+    Returns:
+        List of file path lists
+    """
+    base_length = sum(len(arg) + 1 for arg in cmd)
+    chunks = []
+    current = []
+    length = base_length
+
+    for filepath in files:
+        if current and length + len(filepath) + 1 > MAX_COMMAND_LENGTH:
+            chunks.append(current)
+            current = []
+            length = base_length
+        current.append(filepath)
+        length += len(filepath) + 1
+
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def reported_files(stderr: str, files: list) -> list:
+    """Return the files clang-format emitted "file:line:col: ..." diagnostics for."""
+    candidates = set(files)
+    reported = []
+    for line in stderr.splitlines():
+        filepath = line.split(":", 1)[0]
+        if filepath in candidates and filepath not in reported:
+            reported.append(filepath)
+    return reported
+
+
+def file_stamp(filepath: str):
+    """Return [mtime_ns, size] for a file, or None if it cannot be stat'ed."""
+    try:
+        st = os.stat(filepath)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def formatter_identity(formatter: str) -> list:
+    """Return the resolved path and --version output of a formatter.
+
+    Either changes when clang-format is upgraded or a different binary
+    comes first on PATH, so cached results from another version are dropped.
+    """
+    path = shutil.which(formatter)
+    if path is None:
+        return [formatter, None]
+    try:
+        result = subprocess.run(
+            [path, "--version"], capture_output=True, text=True, check=False
+        )
+    except OSError:
+        return [path, None]
+    return [path, result.stdout.strip()]
+
+
+def load_format_cache(formatter: str, config_path: Path = None) -> dict:
+    """Load the format cache, starting afresh if the formatter or style changed.
+
+    Args:
+        formatter: Formatter command name
+        config_path: Path to the clang-format style file
+
+    Returns:
+        Dict with keys "style" and "files"
+    """
+    style = [
+        *formatter_identity(formatter),
+        file_stamp(config_path) if config_path else None,
+    ]
+    try:
+        with open(FORMAT_CACHE_PATH) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+
+    if not isinstance(cache, dict) or cache.get("style") != style:
+        return {"style": style, "files": {}}
+    return cache
+
+
+def save_format_cache(cache: dict):
+    """Atomically write the format cache back to disk."""
+    try:
+        with tempfile.NamedTemporaryFile(
+            "w", dir=FORMAT_CACHE_PATH.parent, suffix=".tmp", delete=False
+        ) as f:
+            json.dump(cache, f)
+        os.replace(f.name, FORMAT_CACHE_PATH)
+    except OSError as e:
+        print(f"Warning: Could not write format cache: {e}", file=sys.stderr)
 
 
 def format_c_files(
@@ -68,15 +231,20 @@ def format_c_files(
     config_path: Path = None,
     check_only: bool = False,
     verbose: bool = False,
+    use_cache: bool = True,
 ) -> int:
     """Format C/header files using clang-format.
 
+    Files whose mtime and size are unchanged since they last formatted or
+    checked cleanly are skipped.
+
     Args:
         files: List of file paths to format
         formatter: Formatter command name
         config_path: Path to a .clang-format config file
         check_only: If True, only check formatting without modifying
         verbose: Print each file being processed
+        use_cache: If False, ignore and do not update the format cache
 
     Returns:
         0 if successful, 1 if changes needed (check_only) or errors
@@ -96,20 +264,52 @@ def format_c_files(
 
     errors = 0
 
-    for filepath in files:
-        if verbose:
-            action = "Checking" if check_only else "Formatting"
-            print(f"{action}: {filepath}")
+    cache = load_format_cache(formatter, config_path) if use_cache else None
+    pending = files
+    if cache:
+        pending = [
+            filepath
+            for filepath in files
+            if cache["files"].get(os.path.abspath(filepath)) != file_stamp(filepath)
+        ]
+
+    if verbose:
+        action = "Checking" if check_only else "Formatting"
+        pending_set = set(pending)
+        for filepath in files:
+            if filepath in pending_set:
+                print(f"{action}: {filepath}")
+            else:
+                print(f"Unchanged: {filepath}")
 
-        result = subprocess.run(cmd + [filepath], capture_output=True)
+    # clang-format takes any number of files, so run it once per chunk
+    # rather than once per file
+    for chunk in chunk_files(pending, cmd):
+        result = subprocess.run(cmd + chunk, capture_output=True, text=True)
+        failed = []
         if result.returncode != 0:
-            errors += 1
+            failed = reported_files(result.stderr, chunk) or chunk
+
+        if cache:
+            for filepath in chunk:
+                if filepath not in failed:
+                    key = os.path.abspath(filepath)
+                    cache["files"][key] = file_stamp(filepath)
+
+        if not failed:
+            continue
+
+        errors += len(failed)
+        for filepath in failed:
             if check_only:
                 print(f"Needs formatting: {filepath}")
             else:
                 print(f"Error formatting: {filepath}")
-                if result.stderr:
-                    print(result.stderr.decode())
+        if not check_only and result.stderr:
+            print(result.stderr)
+
+    if cache and pending:
+        save_format_cache(cache)
 
     if check_only:
         if errors > 0:
@@ -123,7 +323,11 @@ def format_c_files(
             print(f"\n{errors} file(s) had errors.")
             return 1
         else:
-            print(f"Formatted {len(files)} C/header file(s).")
+            skipped = len(files) - len(pending)
+            print(
+                f"Formatted {len(pending)} C/header file(s), "
+                f"skipped {skipped} unchanged."
+            )
             return 0
 
 
@@ -215,6 +419,11 @@ def main():
         default="clang-format",
         help="Formatter command (default: clang-format)",
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Re-run clang-format on files unchanged since the last run",
+    )
 
     args = parser.parse_args()
 
@@ -247,6 +456,7 @@ def main():
         config_path=CLANG_CONFIG_PATH,
         check_only=args.check,
         verbose=args.verbose,
+        use_cache=not args.no_cache,
     )
     ruff_result = format_python_files(
         files=ruff_files,
@@ -8,13 +8,22 @@ Runtime libraries are installed into a target sysroot.
 """
 
 import argparse
+import concurrent.futures
+import functools
+import hashlib
+import importlib.util
+import json
+import mmap
 import multiprocessing
 import os
 import platform
 import shutil
+import stat
 import subprocess
 import sys
 import tarfile
+import tempfile
+import threading
 import urllib.request
 from pathlib import Path
 
@@ -42,6 +51,31 @@ URLS = {
     "musl": "https://musl.libc.org/releases/musl-{version}.tar.gz",
 }
 
+# Per-user cache shared by every toolchain prefix on this host
+CACHE_ROOT = (
+    Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+    / "valecium-toolchain"
+)
+
+# Extracted source trees, keyed by the SHA256 of their tarball
+SOURCE_CACHE = CACHE_ROOT / "src"
+
+# Staged install trees, keyed by a hash of everything a build depends on
+INSTALL_CACHE = CACHE_ROOT / "install"
+
+# Multi-threaded decompressors tar can hand archives to, by suffix
+DECOMPRESSORS = {
+    ".tar.xz": ("xz", "xz -d -T0"),
+    ".tar.gz": ("pigz", "pigz -d"),
+}
+
+# Read/copy block size for stdlib tar extraction; tarfile's defaults are
+# 10-64 KiB, which makes per-chunk interpreter overhead dominate
+TAR_BUFSIZE = 1 << 20
+
+# Keeps log lines from concurrent downloads from interleaving
+OUTPUT_LOCK = threading.Lock()
+
 
 # =============================================================================
 # Helper Functions
@@ -53,45 +87,370 @@ def get_cpu_count() -> int:
     return multiprocessing.cpu_count()
 
 
+def get_default_jobs() -> int:
+    """Get the default job count; oversubscribe to cover I/O-bound steps."""
+    return get_cpu_count() * 2
+
+
+def get_load_limit() -> int:
+    """Get the load average above which make stops spawning jobs."""
+    return max(1, get_cpu_count() * 3 // 2)
+
+
+@functools.cache
+def find_tool(name: str):
+    """Resolve a host tool on PATH, once per process."""
+    return shutil.which(name)
+
+
 def detect_os() -> str:
     """Detect host operating system."""
     return platform.system()
 
 
 def run_command(
-    cmd: list, env: dict = None, cwd: str = None, check: bool = True
+    cmd: list,
+    env: dict = None,
+    cwd: str = None,
+    check: bool = True,
+    preexec_fn=None,
+    base_env: dict = None,
 ) -> subprocess.CompletedProcess:
-    """Run a command with logging."""
+    """Run a command with logging.
+
+    env is overlaid on base_env, or on os.environ when no base is given;
+    without either the child simply inherits the current environment.
+    """
     print(f"  $ {' '.join(cmd)}")
-    merged_env = os.environ.copy()
+    merged_env = base_env
     if env:
-        merged_env.update(env)
+        merged_env = {**(base_env or os.environ), **env}
+
+    return subprocess.run(
+        cmd, env=merged_env, cwd=cwd, check=check, preexec_fn=preexec_fn
+    )
 
-    return subprocess.run(cmd, env=merged_env, cwd=cwd, check=check)
 
+def parse_cpu_list(cpulist: str) -> set:
+    """Parse a sysfs CPU list such as "0-7,16-23" into a set of CPU ids."""
+    cpus = set()
+    for part in cpulist.strip().split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
 
-def download_file(url: str, dest: str):
-    """Download a file with progress indicator."""
-    print(f"Downloading: {url}")
 
-    def progress_hook(block_num, block_size, total_size):
-        downloaded = block_num * block_size
-        if total_size > 0:
-            percent = min(100, downloaded * 100 // total_size)
-            bar = "=" * (percent // 2) + " " * (50 - percent // 2)
-            print(f"\r  [{bar}] {percent}%", end="", flush=True)
+def get_numa_nodes() -> dict:
+    """Map each NUMA node id to its CPUs; empty when sysfs has no nodes."""
+    nodes = {}
+    for node_dir in Path("/sys/devices/system/node").glob("node[0-9]*"):
+        try:
+            cpus = parse_cpu_list((node_dir / "cpulist").read_text())
+        except OSError:
+            continue
+        if cpus:
+            nodes[int(node_dir.name[4:])] = cpus
+    return dict(sorted(nodes.items()))
 
-    urllib.request.urlretrieve(url, dest, progress_hook)
-    print()  # Newline after progress
+
+def download_file(url: str, dest: str):
+    """Download a file, logging when it starts and finishes.
+
+    Uses aria2c with multiple connections when installed, otherwise streams
+    the response in 1 MiB chunks. The file is written to a .part path and
+    renamed on success so an interrupted download is never mistaken for a
+    complete tarball.
+    """
+    with OUTPUT_LOCK:
+        print(f"Downloading: {url}")
+
+    partial = dest + ".part"
+    if find_tool("aria2c"):
+        subprocess.run(
+            [
+                "aria2c",
+                "-x16",
+                "-s16",
+                "--allow-overwrite=true",
+                "--console-log-level=warn",
+                "--summary-interval=0",
+                "-d",
+                os.path.dirname(os.path.abspath(partial)),
+                "-o",
+                os.path.basename(partial),
+                url,
+            ],
+            check=True,
+        )
+    else:
+        with urllib.request.urlopen(url) as response, open(partial, "wb") as f:
+            shutil.copyfileobj(response, f, 1 << 20)
+    os.replace(partial, dest)
+
+    with OUTPUT_LOCK:
+        print(f"Downloaded: {os.path.basename(dest)}")
 
 
 def extract_archive(archive: str, dest_dir: str):
-    """Extract a tar archive."""
+    """Extract a tar archive, using a parallel decompressor when available."""
     print(f"Extracting: {archive}")
-    with tarfile.open(archive) as tar:
+
+    for suffix, (tool, program) in DECOMPRESSORS.items():
+        if archive.endswith(suffix) and find_tool("tar") and find_tool(tool):
+            subprocess.run(
+                [
+                    "tar",
+                    f"--use-compress-program={program}",
+                    "-xf",
+                    archive,
+                    "-C",
+                    dest_dir,
+                ],
+                check=True,
+            )
+            return
+
+    # libarchive walks members in C; much faster than tarfile on the
+    # 100k-entry gcc tree when no native decompressor is installed
+    if importlib.util.find_spec("libarchive") is not None:
+        import libarchive
+
+        archive = os.path.abspath(archive)
+        cwd = os.getcwd()
+        os.chdir(dest_dir)
+        try:
+            libarchive.extract_file(archive)
+        finally:
+            os.chdir(cwd)
+        return
+
+    # Stream mode ("r|*") refuses backward seeks, so the compressed stream is
+    # decoded exactly once in storage order
+    with tarfile.open(
+        archive, mode="r|*", bufsize=TAR_BUFSIZE, copybufsize=TAR_BUFSIZE
+    ) as tar:
         tar.extractall(dest_dir)
 
 
+def file_sha256(path) -> str:
+    """Return the hex SHA256 of a file's contents."""
+    with open(path, "rb") as f:
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, "sha256").hexdigest()
+
+        # Python < 3.11: feed mapped slices so the loop stays in C
+        digest = hashlib.sha256()
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                for offset in range(0, len(m), 1 << 20):
+                    digest.update(m[offset : offset + (1 << 20)])
+        return digest.hexdigest()
+
+
+def tarball_hash(archive: Path) -> str:
+    """Return the SHA256 of a tarball, reusing its .sha256 sidecar if current."""
+    sidecar = archive.with_name(archive.name + ".sha256")
+    if sidecar.exists() and sidecar.stat().st_mtime_ns >= archive.stat().st_mtime_ns:
+        return sidecar.read_text().strip()
+
+    digest = file_sha256(archive)
+    sidecar.write_text(digest + "\n")
+    return digest
+
+
+def extract_to_cache(archive: str, cache_dir: str):
+    """Extract a tar archive into cache_dir, publishing it atomically.
+
+    The archive is unpacked into a scratch directory next to cache_dir and
+    renamed into place, so an interrupted extraction never leaves a
+    partial tree behind. If another build published cache_dir first, the
+    scratch copy is discarded.
+    """
+    parent = os.path.dirname(cache_dir)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".extract-", dir=parent)
+
+    try:
+        extract_archive(archive, staging)
+        os.rename(staging, cache_dir)
+    except OSError:
+        if not os.path.isdir(cache_dir):
+            raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+class HashingReader:
+    """File-like wrapper that hashes everything read through it."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.digest = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self.digest.update(data)
+        return data
+
+
+def download_and_extract_stream(url: str, cache_root: str) -> str:
+    """Stream a tarball from url straight into the source cache.
+
+    Nothing is written to disk but the extracted tree: the response is
+    decompressed in tarfile's stream mode and hashed on the way through,
+    then published as cache_root/<sha256> exactly like extract_to_cache().
+    Returns the tarball's SHA256.
+    """
+    with OUTPUT_LOCK:
+        print(f"Streaming: {url}")
+
+    os.makedirs(cache_root, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".extract-", dir=cache_root)
+
+    try:
+        with urllib.request.urlopen(url) as response:
+            stream = HashingReader(response)
+            with tarfile.open(
+                fileobj=stream,
+                mode="r|*",
+                bufsize=TAR_BUFSIZE,
+                copybufsize=TAR_BUFSIZE,
+            ) as tar:
+                tar.extractall(staging)
+            # Padding after the end-of-archive marker is part of the digest
+            while stream.read(1 << 20):
+                pass
+
+        digest = stream.digest.hexdigest()
+        cache_dir = os.path.join(cache_root, digest)
+        try:
+            os.rename(staging, cache_dir)
+        except OSError:
+            if not os.path.isdir(cache_dir):
+                raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    with OUTPUT_LOCK:
+        print(f"Extracted: {url.split('/')[-1]}")
+    return digest
+
+
+def tree_entries(tree: Path, jobs: int) -> dict:
+    """Describe every file under tree, keyed by its path relative to tree.
+
+    Regular files map to [size, mtime_ns, sha256] and symlinks, including
+    symlinks to directories, to {"link": target}; the digests are computed
+    in parallel.
+    """
+    links = {}
+    paths = []
+    for root, dirs, files in os.walk(tree):
+        # os.walk lists directory symlinks under dirs without following them
+        for name in dirs:
+            path = Path(root) / name
+            if path.is_symlink():
+                links[str(path.relative_to(tree))] = {"link": os.readlink(path)}
+        for name in files:
+            path = Path(root) / name
+            key = str(path.relative_to(tree))
+            if path.is_symlink():
+                links[key] = {"link": os.readlink(path)}
+            else:
+                paths.append((key, path))
+
+    entries = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        digests = executor.map(file_sha256, [path for _, path in paths])
+        for (key, path), digest in zip(paths, digests):
+            st = path.stat()
+            entries[key] = [st.st_size, st.st_mtime_ns, digest]
+    entries.update(links)
+    return entries
+
+
+def tree_matches(tree: Path, entries: dict, jobs: int) -> bool:
+    """Check the files under tree against entries from tree_entries().
+
+    Files whose size and mtime are unchanged are trusted; only those
+    with a different mtime are rehashed, in parallel.
+    """
+    rehash = []
+    for key, entry in entries.items():
+        path = tree / key
+        if isinstance(entry, dict):
+            if not path.is_symlink() or os.readlink(path) != entry["link"]:
+                return False
+            continue
+
+        size, mtime_ns, digest = entry
+        try:
+            st = path.lstat()
+        except OSError:
+            return False
+        if st.st_size != size:
+            return False
+        if st.st_mtime_ns != mtime_ns:
+            rehash.append((path, digest))
+
+    if not rehash:
+        return True
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        digests = executor.map(file_sha256, [path for path, _ in rehash])
+        return all(actual == expected for actual, (_, expected) in zip(digests, rehash))
+
+
+def make_read_only(tree: Path):
+    """Clear the write bits on every regular file under tree."""
+    for root, _, files in os.walk(tree):
+        for name in files:
+            path = os.path.join(root, name)
+            if not os.path.islink(path):
+                mode = stat.S_IMODE(os.lstat(path).st_mode)
+                os.chmod(path, mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+
+def publish_tree(src: Path, dest: Path):
+    """Hardlink a staged install tree into dest, replacing existing entries.
+
+    The published files share their inodes with the install cache, so
+    anything that edits a file in dest in place (strip, a libtool relink,
+    sed on .la or .pc files) also changes the cached copy. Cache entries
+    are therefore read-only, and _cached_install() rechecks an entry's
+    digests before reusing it. Existing entries in dest are unlinked
+    rather than overwritten, so later installs never write through a link
+    into the cached tree. Falls back to copying, with the owner's write
+    bit restored, when src and dest are on different filesystems.
+    """
+    link = True
+    for root, dirs, files in os.walk(src):
+        target_root = os.path.join(dest, os.path.relpath(root, src))
+        os.makedirs(target_root, exist_ok=True)
+
+        for name in dirs + files:
+            src_path = os.path.join(root, name)
+            dst_path = os.path.join(target_root, name)
+            if os.path.isdir(src_path) and not os.path.islink(src_path):
+                continue
+
+            if os.path.lexists(dst_path):
+                os.unlink(dst_path)
+            if os.path.islink(src_path):
+                os.symlink(os.readlink(src_path), dst_path)
+                continue
+
+            if link:
+                try:
+                    os.link(src_path, dst_path)
+                    continue
+                except OSError:
+                    link = False
+            shutil.copy2(src_path, dst_path)
+            os.chmod(dst_path, stat.S_IMODE(os.lstat(dst_path).st_mode) | stat.S_IWUSR)
+
+
 # =============================================================================
 # Build Classes
 # =============================================================================
@@ -100,30 +459,123 @@ def extract_archive(archive: str, dest_dir: str):
 class ToolchainBuilder:
     """Builds a complete cross-compilation toolchain."""
 
-    def __init__(self, prefix: str, target: str, jobs: int = None):
+    def __init__(
+        self,
+        prefix: str,
+        target: str,
+        jobs: int = None,
+        use_ccache: bool = True,
+        keep_tarballs: bool = False,
+        numa: bool = False,
+    ):
         """
         Args:
             prefix: Toolchain installation prefix (e.g., /opt/toolchain)
             target: Target triple (e.g., i686-linux-musl)
             jobs: Number of parallel jobs (-j flag)
+            use_ccache: Wrap compilers with ccache when it is installed
+            keep_tarballs: Save tarballs under src/ instead of streaming
+                them straight into the source cache
+            numa: Bind each build phase to its own NUMA node, rotating
+                through the host's nodes
         """
         self.prefix = Path(prefix).resolve()
         self.target = target
-        self.jobs = jobs or get_cpu_count()
+        self.jobs = jobs or get_default_jobs()
+        self.make_jobs = [f"-j{self.jobs}", f"-l{get_load_limit()}"]
+        self.keep_tarballs = keep_tarballs
+
+        # NUMA binding only pays off with more than one node
+        self.numa_nodes = get_numa_nodes() if numa else {}
+        if len(self.numa_nodes) < 2:
+            self.numa_nodes = {}
+        self.numa_node = None
 
         # Derived paths
         self.bin_dir = self.prefix / "bin"
         self.sysroot = self.prefix / self.target / "sysroot"
+        # Cross tools by absolute path, so envs never depend on a PATH lookup
+        self.cross_tools = {
+            tool: self.bin_dir / f"{self.target}-{tool}"
+            for tool in ("as", "gcc", "ar", "ranlib")
+        }
 
         # Source/build directories
         self.srcpath = self.prefix / "src"
         self.build_dir = self.prefix / "build"
+        self.manifest_dir = self.prefix / ".manifest"
 
         # Environment for builds
         self.build_env = {
             "PATH": f"{self.bin_dir}:{os.environ.get('PATH', '')}",
+            # Recursive makes that do not inherit the jobserver still run
+            # in parallel under the same load cap
+            "MAKEFLAGS": " ".join(self.make_jobs),
         }
 
+        # Wrap compilers with ccache; its cache lives under the prefix so it
+        # survives clean/clean-all, which only remove build and source trees
+        self.ccache = use_ccache and find_tool("ccache") is not None
+        if self.ccache:
+            self.build_env.update(
+                {
+                    "CC": "ccache gcc",
+                    "CXX": "ccache g++",
+                    "CCACHE_DIR": str(self.prefix / ".ccache"),
+                }
+            )
+
+        # Full environment for build commands, merged once; _run only
+        # overlays per-command deltas on top of it
+        self._base_env = {**os.environ, **self.build_env}
+
+    def _bind_phase(self, phase: int):
+        """Select the NUMA node for a top-level build phase.
+
+        Phases run one after another, so a bound phase only has its node's
+        CPUs; make's job count and load limit are scaled down to match
+        instead of oversubscribing that node with the whole host's jobs.
+        """
+        if not self.numa_nodes:
+            return
+
+        nodes = list(self.numa_nodes)
+        self.numa_node = nodes[phase % len(nodes)]
+        cpus = len(self.numa_nodes[self.numa_node])
+        self.make_jobs = [
+            f"-j{min(self.jobs, cpus * 2)}",
+            f"-l{max(1, cpus * 3 // 2)}",
+        ]
+        self.build_env["MAKEFLAGS"] = " ".join(self.make_jobs)
+        self._base_env["MAKEFLAGS"] = self.build_env["MAKEFLAGS"]
+        print(f"Binding to NUMA node {self.numa_node} ({cpus} CPUs)")
+
+    def _run(self, cmd: list, env: dict = None, cwd: str = None):
+        """Run a build command in the builder's environment.
+
+        The command runs on the current phase's NUMA node, if any.
+        """
+        node = self.numa_node
+        if node is None:
+            return run_command(cmd, env=env, cwd=cwd, base_env=self._base_env)
+
+        # Memory is only preferred on the node, so a phase that outgrows the
+        # node's RAM spills to other nodes instead of hitting OOM
+        if find_tool("numactl"):
+            cmd = ["numactl", f"--cpunodebind={node}", f"--preferred={node}", *cmd]
+            return run_command(cmd, env=env, cwd=cwd, base_env=self._base_env)
+
+        # Without numactl only CPU affinity can be pinned; memory follows
+        # the kernel's first-touch policy
+        cpus = self.numa_nodes[node]
+        return run_command(
+            cmd,
+            env=env,
+            cwd=cwd,
+            preexec_fn=lambda: os.sched_setaffinity(0, cpus),
+            base_env=self._base_env,
+        )
+
     def setup_directories(self):
         """Create necessary directories."""
         self.prefix.mkdir(parents=True, exist_ok=True)
@@ -132,8 +584,33 @@ class ToolchainBuilder:
         self.sysroot.mkdir(parents=True, exist_ok=True)
         (self.sysroot / "usr").mkdir(exist_ok=True)
 
+    def _tarball_names(self) -> set:
+        """Return the file names of the source tarballs and their sidecars."""
+        names = set()
+        for pkg, version in VERSIONS.items():
+            filename = URLS[pkg].format(version=version).split("/")[-1]
+            names.update((filename, f"{filename}.sha256"))
+        return names
+
+    def _indexed_source(self, filename: str, src_name: str):
+        """Return the cached tree recorded for a tarball, if it still exists."""
+        index = SOURCE_CACHE / f"{filename}.sha256"
+        if not index.exists():
+            return None
+        cached_path = SOURCE_CACHE / index.read_text().strip() / src_name
+        return cached_path if cached_path.is_dir() else None
+
     def download_sources(self):
-        """Download all source tarballs."""
+        """Download all source tarballs concurrently.
+
+        Without keep_tarballs this is a no-op; extract_sources() streams
+        the sources instead. Tarballs whose tree is already in the source
+        cache are not downloaded again.
+        """
+        if not self.keep_tarballs:
+            return
+
+        pending = []
         for pkg, version in VERSIONS.items():
             url = URLS[pkg].format(version=version)
             filename = url.split("/")[-1]
@@ -142,11 +619,38 @@ class ToolchainBuilder:
             if dest.exists():
                 print(f"Already downloaded: {filename}")
                 continue
+            if self._indexed_source(filename, f"{pkg}-{version}") is not None:
+                print(f"Using cached source tree: {pkg}-{version}")
+                continue
+
+            pending.append((url, str(dest)))
 
-            download_file(url, str(dest))
+        if not pending:
+            return
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=len(pending)
+        ) as executor:
+            futures = [
+                executor.submit(download_file, url, dest) for url, dest in pending
+            ]
+            for future in futures:
+                future.result()
 
     def extract_sources(self):
-        """Extract all source tarballs."""
+        """Link extracted source trees into the source directory.
+
+        Trees are extracted once into SOURCE_CACHE, keyed by the SHA256 of
+        their tarball, and symlinked into place; archives without a cached
+        tree are extracted in parallel, one worker process per archive.
+        Packages with no tarball on disk are streamed from their URL. Either
+        way the digest is recorded in SOURCE_CACHE/<tarball>.sha256 so later
+        builds find the tree without downloading it again.
+        """
+        pending = []
+        streams = []
+        links = []
+        indexes = []
         for pkg, version in VERSIONS.items():
             url = URLS[pkg].format(version=version)
             filename = url.split("/")[-1]
@@ -159,15 +663,212 @@ class ToolchainBuilder:
             if src_path.exists():
                 print(f"Already extracted: {src_name}")
                 continue
+            if src_path.is_symlink():
+                # Dangling link into a cache entry that has been removed
+                src_path.unlink()
+
+            index = SOURCE_CACHE / f"{filename}.sha256"
+            if not archive.exists():
+                cached_path = self._indexed_source(filename, src_name)
+                if cached_path is not None:
+                    print(f"Using cached source tree: {src_name}")
+                    links.append((src_path, cached_path))
+                    continue
+                streams.append((url, index, src_path, src_name))
+                continue
+
+            digest = tarball_hash(archive)
+            cache_dir = SOURCE_CACHE / digest
+            if (cache_dir / src_name).is_dir():
+                print(f"Using cached source tree: {src_name}")
+            else:
+                pending.append((archive, cache_dir))
+            links.append((src_path, cache_dir / src_name))
+            indexes.append((index, digest))
+
+        if pending:
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=len(pending)
+            ) as executor:
+                futures = {}
+                for archive, cache_dir in pending:
+                    future = executor.submit(
+                        extract_to_cache, str(archive), str(cache_dir)
+                    )
+                    futures[future] = archive
+
+                for future in concurrent.futures.as_completed(futures):
+                    archive = futures[future]
+                    try:
+                        future.result()
+                    except (EOFError, Exception) as e:
+                        # If extraction fails, remove the corrupted archive
+                        print(f"Error extracting {archive.name}: {e}")
+                        print(f"Removing corrupted archive: {archive}")
+                        archive.unlink()
+                        archive.with_name(archive.name + ".sha256").unlink(
+                            missing_ok=True
+                        )
+                        raise
+
+        for index, digest in indexes:
+            index.write_text(digest + "\n")
+
+        if streams:
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=len(streams)
+            ) as executor:
+                futures = [
+                    executor.submit(download_and_extract_stream, url, str(SOURCE_CACHE))
+                    for url, _, _, _ in streams
+                ]
+                for future, (_, index, src_path, src_name) in zip(futures, streams):
+                    digest = future.result()
+                    index.write_text(digest + "\n")
+                    links.append((src_path, SOURCE_CACHE / digest / src_name))
+
+        for src_path, cached_path in links:
+            src_path.symlink_to(cached_path, target_is_directory=True)
+
+    def _source_digest(self, pkg: str) -> str:
+        """Identify a package's sources by their tarball SHA256."""
+        version = VERSIONS[pkg]
+        src_path = self.srcpath / f"{pkg}-{version}"
+        if src_path.is_symlink():
+            # Linked trees live under SOURCE_CACHE/<sha256>/
+            return Path(os.readlink(src_path)).parent.name
+
+        filename = URLS[pkg].format(version=version).split("/")[-1]
+        archive = self.srcpath / filename
+        if archive.exists():
+            return tarball_hash(archive)
+        return f"{pkg}-{version}"
+
+    def _cache_key(self, pkgs: tuple, configure_opts: list) -> str:
+        """Hash the inputs of a build step into an install cache key.
+
+        Args:
+            pkgs: Packages whose sources the step compiles or links against
+            configure_opts: Resolved configure options for the step
+        """
+        inputs = {
+            "sources": {pkg: self._source_digest(pkg) for pkg in pkgs},
+            "configure": configure_opts,
+            "target": self.target,
+            "host": [platform.system(), platform.machine()],
+        }
+        encoded = json.dumps(inputs, sort_keys=True).encode()
+        return hashlib.sha256(encoded).hexdigest()
 
+    def _cached_install(self, phase: str, cache_key: str, dest: Path, install_fn):
+        """Install a build step into dest, reusing a cached install if any.
+
+        On a cache miss, install_fn is called with a fresh staging directory
+        to use as DESTDIR and must return the directory inside it that
+        mirrors dest. That tree is stored read-only in INSTALL_CACHE,
+        together with an index of its files' digests, before being
+        published into dest, and the published files are recorded in the
+        phase's manifest. A cached entry that no longer matches its index
+        was edited through the prefix; it is evicted and rebuilt.
+
+        Args:
+            phase: Build phase name, used for the manifest
+            cache_key: Key from _cache_key()
+            dest: Directory the installed tree belongs in
+            install_fn: Callable that configures, builds and installs
+        """
+        cached = INSTALL_CACHE / cache_key
+        entries = self._cached_entries(cached)
+        if entries is None and cached.is_dir():
+            print(f"Evicting damaged cached install: {cache_key[:16]}")
+            evicted = INSTALL_CACHE / f".evict-{cache_key}.{os.getpid()}"
             try:
-                extract_archive(str(archive), str(self.srcpath))
-            except (EOFError, Exception) as e:
-                # If extraction fails, remove the corrupted archive
-                print(f"Error extracting {filename}: {e}")
-                print(f"Removing corrupted archive: {archive}")
-                archive.unlink()
-                raise
+                os.rename(cached, evicted)
+            except OSError:
+                # Another build evicted or replaced it first
+                pass
+            shutil.rmtree(evicted, ignore_errors=True)
+            entries = self._cached_entries(cached)
+
+        if entries is not None:
+            print(f"Using cached install: {cache_key[:16]}")
+        else:
+            INSTALL_CACHE.mkdir(parents=True, exist_ok=True)
+            staging = Path(tempfile.mkdtemp(prefix=".install-", dir=self.build_dir))
+            scratch = INSTALL_CACHE / f".{cache_key}.{os.getpid()}"
+            try:
+                built = install_fn(staging)
+                scratch.mkdir()
+                shutil.move(str(built), str(scratch / "tree"))
+                make_read_only(scratch / "tree")
+                entries = tree_entries(scratch / "tree", self.jobs)
+                (scratch / "files.json").write_text(json.dumps(entries, sort_keys=True))
+                os.rename(scratch, cached)
+            except OSError:
+                if not cached.is_dir():
+                    raise
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+                shutil.rmtree(scratch, ignore_errors=True)
+
+        publish_tree(cached / "tree", dest)
+        self._write_manifest(phase, cache_key, entries, dest)
+
+    def _cached_entries(self, cached: Path):
+        """Return a cache entry's file index if the entry still matches it."""
+        try:
+            entries = json.loads((cached / "files.json").read_text())
+        except (OSError, ValueError):
+            return None
+        if not tree_matches(cached / "tree", entries, self.jobs):
+            return None
+        return entries
+
+    def _write_manifest(self, phase: str, cache_key: str, tree_files: dict, dest: Path):
+        """Record the files a phase published into dest.
+
+        tree_files is the cache entry's index from tree_entries(); the
+        published files are hardlinks or mtime-preserving copies of those,
+        so its sizes, mtimes, digests and link targets are rekeyed by path
+        relative to the prefix rather than hashed again. Files the phase
+        overwrote are dropped from other phases' manifests, so every path
+        belongs to the phase that installed it last.
+        """
+        prefix_rel = dest.relative_to(self.prefix)
+        entries = {str(prefix_rel / rel): entry for rel, entry in tree_files.items()}
+
+        self.manifest_dir.mkdir(exist_ok=True)
+        for other in self.manifest_dir.glob("*.json"):
+            if other.stem == phase:
+                continue
+            manifest = json.loads(other.read_text())
+            kept = {k: v for k, v in manifest["files"].items() if k not in entries}
+            if len(kept) != len(manifest["files"]):
+                manifest["files"] = kept
+                other.write_text(json.dumps(manifest, sort_keys=True))
+
+        manifest = {"key": cache_key, "files": entries}
+        (self.manifest_dir / f"{phase}.json").write_text(
+            json.dumps(manifest, sort_keys=True)
+        )
+
+    def _verify_manifest(self, phase: str, cache_key: str = None) -> bool:
+        """Check that a phase's installed files still match its manifest.
+
+        Passing cache_key also requires the manifest to come from the same
+        build inputs.
+        """
+        try:
+            manifest = json.loads((self.manifest_dir / f"{phase}.json").read_text())
+        except (OSError, ValueError):
+            return False
+        if cache_key is not None and manifest["key"] != cache_key:
+            return False
+        return tree_matches(self.prefix, manifest["files"], self.jobs)
+
+    def _prefix_in(self, destdir: Path) -> Path:
+        """Return where files installed under the prefix land in DESTDIR."""
+        return destdir / self.prefix.relative_to(self.prefix.anchor)
 
     def _get_configure_opts(self, pkg: str) -> list:
         """Get platform-specific configure options."""
@@ -178,12 +879,21 @@ class ToolchainBuilder:
         print("\n" + "=" * 60)
         print("Building binutils")
         print("=" * 60)
+        self._bind_phase(0)
 
         version = VERSIONS["binutils"]
         src_path = self.srcpath / f"binutils-{version}"
         build_path = self.build_dir / f"binutils-{self.target}"
 
-        if (self.bin_dir / f"{self.target}-as").exists():
+        configure_opts = [
+            f"--prefix={self.prefix}",
+            f"--target={self.target}",
+            "--disable-nls",
+            "--disable-werror",
+        ] + self._get_configure_opts("binutils")
+        cache_key = self._cache_key(("binutils",), configure_opts)
+
+        if self._verify_manifest("binutils", cache_key):
             print("binutils already installed, skipping...")
             return
 
@@ -193,46 +903,38 @@ class ToolchainBuilder:
         clean_env = {
             "CFLAGS": "",
             "ASMFLAGS": "",
-            "CC": "",
-            "CXX": "",
+            "CC": self.build_env.get("CC", ""),
+            "CXX": self.build_env.get("CXX", ""),
             "LD": "",
             "ASM": "",
             "LINKFLAGS": "",
             "LIBS": "",
         }
 
-        configure_opts = [
-            f"--prefix={self.prefix}",
-            f"--target={self.target}",
-            "--disable-nls",
-            "--disable-werror",
-        ] + self._get_configure_opts("binutils")
+        def install(destdir: Path) -> Path:
+            self._run(
+                [str(src_path / "configure")] + configure_opts,
+                env=clean_env,
+                cwd=str(build_path),
+            )
 
-        run_command(
-            [str(src_path / "configure")] + configure_opts,
-            env={**self.build_env, **clean_env},
-            cwd=str(build_path),
-        )
+            self._run(["make", *self.make_jobs], cwd=str(build_path))
+            self._run(["make", "install", f"DESTDIR={destdir}"], cwd=str(build_path))
+            return self._prefix_in(destdir)
 
-        run_command(["make", f"-j{self.jobs}"], cwd=str(build_path))
-        run_command(["make", "install"], cwd=str(build_path))
+        self._cached_install("binutils", cache_key, self.prefix, install)
 
     def build_gcc_stage1(self):
         """Build GCC stage 1 (C only, no libc)."""
         print("\n" + "=" * 60)
         print("Building GCC Stage 1")
         print("=" * 60)
+        self._bind_phase(1)
 
         version = VERSIONS["gcc"]
         src_path = self.srcpath / f"gcc-{version}"
         build_path = self.build_dir / f"gcc-stage1-{self.target}"
 
-        if (self.bin_dir / f"{self.target}-gcc").exists():
-            print("GCC stage 1 already installed, skipping...")
-            return
-
-        build_path.mkdir(exist_ok=True)
-
         configure_opts = [
             f"--prefix={self.prefix}",
             f"--target={self.target}",
@@ -246,44 +948,52 @@ class ToolchainBuilder:
             f"--with-sysroot={self.sysroot}",
             "--with-native-system-header-dir=/usr/include",
         ] + self._get_configure_opts("gcc")
+        cache_key = self._cache_key(("binutils", "gcc"), configure_opts)
 
-        run_command(
-            [str(src_path / "configure")] + configure_opts,
-            env=self.build_env,
-            cwd=str(build_path),
-        )
+        if self._verify_manifest("gcc-stage1", cache_key):
+            print("GCC stage 1 already installed, skipping...")
+            return
 
-        run_command(
-            ["make", f"-j{self.jobs}", "all-gcc", "all-target-libgcc"],
-            cwd=str(build_path),
-        )
-        run_command(
-            ["make", "install-gcc", "install-target-libgcc"],
-            cwd=str(build_path),
-        )
+        build_path.mkdir(exist_ok=True)
+
+        def install(destdir: Path) -> Path:
+            self._run(
+                [str(src_path / "configure")] + configure_opts,
+                cwd=str(build_path),
+            )
+
+            self._run(
+                ["make", *self.make_jobs, "all-gcc", "all-target-libgcc"],
+                cwd=str(build_path),
+            )
+            self._run(
+                [
+                    "make",
+                    "install-gcc",
+                    "install-target-libgcc",
+                    f"DESTDIR={destdir}",
+                ],
+                cwd=str(build_path),
+            )
+            return self._prefix_in(destdir)
+
+        self._cached_install("gcc-stage1", cache_key, self.prefix, install)
 
     def build_musl(self):
         """Build and install musl into the toolchain sysroot."""
         print("\n" + "=" * 60)
         print("Building musl")
         print("=" * 60)
+        self._bind_phase(2)
 
         version = VERSIONS["musl"]
         src_path = self.srcpath / f"musl-{version}"
         build_path = self.build_dir / f"musl-{self.target}"
-        libc_archive = self.sysroot / "usr" / "lib" / "libc.so"
-
-        if libc_archive.exists():
-            print("musl already installed in sysroot, skipping...")
-            return
-
-        build_path.mkdir(exist_ok=True)
 
         cross_env = {
-            **self.build_env,
-            "CC": f"{self.target}-gcc",
-            "AR": f"{self.target}-ar",
-            "RANLIB": f"{self.target}-ranlib",
+            "CC": f"{'ccache ' if self.ccache else ''}{self.cross_tools['gcc']}",
+            "AR": str(self.cross_tools["ar"]),
+            "RANLIB": str(self.cross_tools["ranlib"]),
         }
 
         configure_opts = [
@@ -293,32 +1003,42 @@ class ToolchainBuilder:
             "--enable-static",
             "--enable-shared",
         ]
+        cache_key = self._cache_key(("binutils", "gcc", "musl"), configure_opts)
 
-        run_command(
-            [str(src_path / "configure")] + configure_opts,
-            env=cross_env,
-            cwd=str(build_path),
-        )
+        if self._verify_manifest("musl", cache_key):
+            print("musl already installed in sysroot, skipping...")
+            return
 
-        run_command(["make", f"-j{self.jobs}"], env=cross_env, cwd=str(build_path))
-        run_command(
-            ["make", "install", f"DESTDIR={self.sysroot}"],
-            env=cross_env,
-            cwd=str(build_path),
-        )
+        build_path.mkdir(exist_ok=True)
+
+        def install(destdir: Path) -> Path:
+            self._run(
+                [str(src_path / "configure")] + configure_opts,
+                env=cross_env,
+                cwd=str(build_path),
+            )
+
+            self._run(["make", *self.make_jobs], env=cross_env, cwd=str(build_path))
+            self._run(
+                ["make", "install", f"DESTDIR={destdir}"],
+                env=cross_env,
+                cwd=str(build_path),
+            )
+            return destdir
+
+        self._cached_install("musl", cache_key, self.sysroot, install)
 
     def build_gcc_stage2(self):
         """Build GCC stage 2 against the populated sysroot."""
         print("\n" + "=" * 60)
         print("Building GCC Stage 2")
         print("=" * 60)
+        self._bind_phase(3)
 
         version = VERSIONS["gcc"]
         src_path = self.srcpath / f"gcc-{version}"
         build_path = self.build_dir / f"gcc-stage2-{self.target}"
 
-        build_path.mkdir(exist_ok=True)
-
         configure_opts = [
             f"--prefix={self.prefix}",
             f"--target={self.target}",
@@ -329,15 +1049,25 @@ class ToolchainBuilder:
             f"--with-sysroot={self.sysroot}",
             "--with-native-system-header-dir=/usr/include",
         ] + self._get_configure_opts("gcc")
+        cache_key = self._cache_key(("binutils", "gcc", "musl"), configure_opts)
 
-        run_command(
-            [str(src_path / "configure")] + configure_opts,
-            env=self.build_env,
-            cwd=str(build_path),
-        )
+        if self._verify_manifest("gcc-stage2", cache_key):
+            print("GCC stage 2 already installed, skipping...")
+            return
 
-        run_command(["make", f"-j{self.jobs}"], cwd=str(build_path))
-        run_command(["make", "install"], cwd=str(build_path))
+        build_path.mkdir(exist_ok=True)
+
+        def install(destdir: Path) -> Path:
+            self._run(
+                [str(src_path / "configure")] + configure_opts,
+                cwd=str(build_path),
+            )
+
+            self._run(["make", *self.make_jobs], cwd=str(build_path))
+            self._run(["make", "install", f"DESTDIR={destdir}"], cwd=str(build_path))
+            return self._prefix_in(destdir)
+
+        self._cached_install("gcc-stage2", cache_key, self.prefix, install)
 
     def get_runtime_sysroot(self) -> Path:
         """Return the sysroot whose contents should be copied into image root."""
@@ -348,6 +1078,7 @@ class ToolchainBuilder:
         print(f"Building toolchain for {self.target}")
         print(f"  Prefix: {self.prefix}")
         print(f"  Jobs: {self.jobs}")
+        print(f"  ccache: {'enabled' if self.ccache else 'disabled'}")
         print()
 
         if self.is_installed():
@@ -383,25 +1114,54 @@ class ToolchainBuilder:
             print(f"Removed: {self.build_dir}")
 
     def clean_all(self):
-        """Remove all build artifacts and sources."""
+        """Remove all build artifacts and sources.
+
+        With keep_tarballs the downloaded tarballs and their .sha256
+        sidecars are left in the source directory.
+        """
         print("Cleaning everything...")
-        for path in [self.build_dir, self.srcpath]:
-            if path.exists():
-                shutil.rmtree(path)
-                print(f"Removed: {path}")
+        if self.build_dir.exists():
+            shutil.rmtree(self.build_dir)
+            print(f"Removed: {self.build_dir}")
+
+        if not self.srcpath.exists():
+            return
+        if not self.keep_tarballs:
+            shutil.rmtree(self.srcpath)
+            print(f"Removed: {self.srcpath}")
+            return
+
+        keep = self._tarball_names()
+        for entry in self.srcpath.iterdir():
+            if entry.name in keep:
+                continue
+            if entry.is_dir() and not entry.is_symlink():
+                shutil.rmtree(entry)
+            else:
+                entry.unlink()
+            print(f"Removed: {entry}")
 
     def is_installed(self) -> bool:
         """Check if cross toolchain and sysroot runtime are already installed.
 
         Returns:
-            True if key toolchain components and musl sysroot archive are found.
+            True if key toolchain components and musl sysroot archive are
+            found and, for prefixes built with manifests, every phase's
+            installed files still match them.
         """
         required_tools = [
-            self.bin_dir / f"{self.target}-as",
-            self.bin_dir / f"{self.target}-gcc",
+            self.cross_tools["as"],
+            self.cross_tools["gcc"],
             self.sysroot / "usr" / "lib" / "libc.so",
         ]
-        return all(path.exists() for path in required_tools)
+        if not all(path.exists() for path in required_tools):
+            return False
+        if not self.manifest_dir.is_dir():
+            return True
+        return all(
+            self._verify_manifest(phase)
+            for phase in ("binutils", "gcc-stage1", "musl", "gcc-stage2")
+        )
 
 
 # =============================================================================
@@ -440,8 +1200,28 @@ Examples:
         "-j",
         "--jobs",
         type=int,
-        default=get_cpu_count(),
-        help=f"Parallel jobs (default: {get_cpu_count()})",
+        default=get_default_jobs(),
+        help=f"Parallel jobs (default: {get_default_jobs()}, load-capped)",
+    )
+    parser.add_argument(
+        "--no-ccache",
+        action="store_true",
+        help="Do not wrap compilers with ccache (for reproducibility runs)",
+    )
+    parser.add_argument(
+        "--keep-tarballs",
+        action="store_true",
+        help="Save source tarballs for offline rebuilds instead of streaming them",
+    )
+    parser.add_argument(
+        "--numa",
+        action="store_true",
+        help=(
+            "Bind each build phase to its own NUMA node (multi-socket hosts). "
+            "Phases run one at a time, so each is limited to one node's CPUs "
+            "in exchange for node-local memory; usually slower for a single "
+            "toolchain build"
+        ),
     )
     parser.add_argument("--clean", action="store_true", help="Remove build directories")
     parser.add_argument(
@@ -485,6 +1265,9 @@ Examples:
         prefix=args.prefix,
         target=target,
         jobs=args.jobs,
+        use_ccache=not args.no_ccache,
+        keep_tarballs=args.keep_tarballs,
+        numa=args.numa,
     )
 
     try:
@@ -2,6 +2,8 @@
 # SPDX-License-Identifier: BSD-3-Clause
 
 import argparse
+import contextlib
+import functools
 import os
 import shutil
 import struct
@@ -10,12 +12,34 @@ import sys
 import tempfile
 import time
 import shlex
+from types import MappingProxyType
+
+try:
+    import pyudev
+except ImportError:
+    pyudev = None
 
 SECTOR_SIZE = 512
 STAGE2_LOAD_ADDR = 0x7E00
 COREFS_LOAD_ADDR = 0x57E00
 DEFAULT_LABEL = "VALECIUM"
 
+# Option each mkfs.<fs> takes to set the volume label
+MKFS_LABEL_FLAGS = MappingProxyType(
+    {
+        "ext2": "-L",
+        "ext3": "-L",
+        "ext4": "-L",
+        "xfs": "-L",
+        "btrfs": "-L",
+        "vfat": "-n",
+        "fat": "-n",
+        "msdos": "-n",
+        "exfat": "-n",
+        "f2fs": "-l",
+    }
+)
+
 
 class DiskBuildError(RuntimeError):
     pass
@@ -31,9 +55,18 @@ def run_command(args, input_text=None, **kwargs):
     )
 
 
+@functools.cache
+def find_tool(name):
+    return shutil.which(name)
+
+
 def require_tool(name):
-    if shutil.which(name) is None:
+    # Commands run the path returned here, so the binary that passed the
+    # check is the one that runs, without another PATH search per call
+    path = find_tool(name)
+    if path is None:
         raise DiskBuildError(f"Missing required tool: {name}")
+    return path
 
 
 def parse_size(value):
@@ -61,7 +94,9 @@ def align_up(value, align):
     return (value + align - 1) // align * align
 
 
-def get_dir_size(path):
+def get_dir_size(path, limit=None):
+    # With a limit the walk stops as soon as the total exceeds it, for
+    # callers that only need to know whether the tree fits somewhere
     total = 0
     for root, _, files in os.walk(path):
         for name in files:
@@ -70,6 +105,8 @@ def get_dir_size(path):
                 total += os.lstat(full).st_size
             except FileNotFoundError:
                 continue
+        if limit is not None and total > limit:
+            break
     return total
 
 
@@ -139,6 +176,19 @@ def build_stage2_blob(stage2_bytes, corefs_bytes):
     return combined, sectors
 
 
+def create_image(path, size, dense=False):
+    # Sparse by default; --dense reserves every extent up front so writes
+    # into the image can never hit ENOSPC later. Neither path writes data.
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        if dense:
+            os.posix_fallocate(fd, 0, size)
+        else:
+            os.ftruncate(fd, size)
+    finally:
+        os.close(fd)
+
+
 def write_at(path, offset, data):
     with open(path, "r+b") as handle:
         handle.seek(offset)
@@ -148,41 +198,95 @@ def write_at(path, offset, data):
 
 
 def copy_tree_contents(src, dst):
-    for root, dirs, files in os.walk(src):
-        rel = os.path.relpath(root, src)
-        target_root = dst if rel == "." else os.path.join(dst, rel)
-        os.makedirs(target_root, exist_ok=True)
-        shutil.copystat(root, target_root, follow_symlinks=False)
-        for name in dirs:
-            src_path = os.path.join(root, name)
-            dst_path = os.path.join(target_root, name)
-            if os.path.islink(src_path):
-                if os.path.lexists(dst_path):
-                    os.remove(dst_path)
-                os.symlink(os.readlink(src_path), dst_path)
-            else:
-                os.makedirs(dst_path, exist_ok=True)
-                shutil.copystat(src_path, dst_path, follow_symlinks=False)
-        for name in files:
-            src_path = os.path.join(root, name)
-            dst_path = os.path.join(target_root, name)
-            if os.path.islink(src_path):
-                if os.path.lexists(dst_path):
-                    os.remove(dst_path)
-                os.symlink(os.readlink(src_path), dst_path)
-            else:
-                shutil.copy2(src_path, dst_path, follow_symlinks=False)
+    # dst is a freshly made filesystem, so no existing entries need replacing
+    shutil.copytree(src, dst, symlinks=True, dirs_exist_ok=True)
+
 
+def find_partition(candidates):
+    for candidate in candidates:
+        if os.path.exists(candidate):
+            return candidate
+    return None
 
-def wait_for_partition(loop_dev):
+
+def wait_for_partition(loop_dev, timeout=5.0):
     candidates = [f"{loop_dev}p1", f"{loop_dev}1"]
-    for _ in range(50):
-        for candidate in candidates:
-            if os.path.exists(candidate):
-                return candidate
-        run_command(["udevadm", "settle"], stdout=subprocess.DEVNULL)
-        time.sleep(0.1)
-    raise DiskBuildError("Partition device did not appear for loopback")
+    part_dev = find_partition(candidates)
+    if part_dev:
+        return part_dev
+
+    if pyudev is None:
+        for _ in range(50):
+            run_command([require_tool("udevadm"), "settle"], stdout=subprocess.DEVNULL)
+            part_dev = find_partition(candidates)
+            if part_dev:
+                return part_dev
+            time.sleep(0.1)
+        raise DiskBuildError("Partition device did not appear for loopback")
+
+    monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+    monitor.filter_by("block", device_type="partition")
+    monitor.start()
+
+    # The node may have appeared before the monitor started listening
+    part_dev = find_partition(candidates)
+    deadline = time.monotonic() + timeout
+    while part_dev is None:
+        remaining = deadline - time.monotonic()
+        device = monitor.poll(timeout=remaining) if remaining > 0 else None
+        if device is None:
+            raise DiskBuildError("Partition device did not appear for loopback")
+        if device.action in ("add", "change") and device.device_node in candidates:
+            part_dev = device.device_node
+    return part_dev
+
+
+def unmount(mount_dir, attempts=5):
+    # umount fails with EBUSY while writeback is still draining; retry with a
+    # short backoff instead of sleeping a fixed amount up front
+    for attempt in range(attempts):
+        try:
+            run_command([require_tool("umount"), mount_dir])
+            return
+        except subprocess.CalledProcessError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.1 * (1 << attempt))
+
+
+@contextlib.contextmanager
+def attached_loop(image_path):
+    # One loop device, with partitions scanned, for the whole build; it is
+    # detached on the way out whether or not the build succeeded
+    loop_dev = subprocess.check_output(
+        [require_tool("losetup"), "--find", "--show", "--partscan", image_path],
+        text=True,
+    ).strip()
+    try:
+        run_command([require_tool("partprobe"), loop_dev], stdout=subprocess.DEVNULL)
+        yield loop_dev
+    finally:
+        with contextlib.suppress(Exception):
+            run_command([require_tool("losetup"), "-d", loop_dev])
+
+
+@contextlib.contextmanager
+def mounted(part_dev):
+    mount_dir = tempfile.mkdtemp(prefix="valecium-img-")
+    try:
+        run_command([require_tool("mount"), part_dev, mount_dir])
+        try:
+            yield mount_dir
+            os.sync()
+        except BaseException:
+            with contextlib.suppress(Exception):
+                unmount(mount_dir)
+            raise
+        unmount(mount_dir)
+    finally:
+        # rmdir, not rmtree: if the unmount failed, leave the image alone
+        with contextlib.suppress(OSError):
+            os.rmdir(mount_dir)
 
 
 def partition_mbr(image_path, start_lba, total_sectors):
@@ -190,69 +294,63 @@ def partition_mbr(image_path, start_lba, total_sectors):
     if end_lba <= start_lba:
         raise DiskBuildError("Partition size is invalid")
 
-    run_command(["parted", "-s", image_path, "mklabel", "msdos"])
+    # parted runs a script of commands in order, so one process does it all
     run_command(
         [
-            "parted",
+            require_tool("parted"),
             "-s",
             "-a",
             "minimal",
             image_path,
+            "mklabel",
+            "msdos",
             "mkpart",
             "primary",
             f"{start_lba}s",
             f"{end_lba}s",
+            "set",
+            "1",
+            "boot",
+            "on",
         ]
     )
-    run_command(["parted", "-s", image_path, "set", "1", "boot", "on"])
 
 
 def partition_gpt(image_path, start_lba, total_sectors, label):
-    if not shutil.which("parted"):
-        raise DiskBuildError("GPT requires parted")
-
     end_lba = total_sectors - 34
     if end_lba <= start_lba:
         raise DiskBuildError("Image size is too small for GPT partition")
 
-    run_command(["parted", "-s", image_path, "mklabel", "gpt"])
     run_command(
         [
-            "parted",
+            require_tool("parted"),
             "-s",
             "-a",
             "minimal",
             image_path,
+            "mklabel",
+            "gpt",
             "mkpart",
             "primary",
             f"{start_lba}s",
             f"{end_lba}s",
+            "name",
+            "1",
+            label,
         ]
     )
-    run_command(["parted", "-s", image_path, "name", "1", label])
 
 
 def mkfs_label_args(fs_type, label):
-    if not label:
+    flag = MKFS_LABEL_FLAGS.get(fs_type)
+    if not label or flag is None:
         return []
-    mapping = {
-        "ext2": ["-L", label],
-        "ext3": ["-L", label],
-        "ext4": ["-L", label],
-        "xfs": ["-L", label],
-        "btrfs": ["-L", label],
-        "vfat": ["-n", label],
-        "fat": ["-n", label],
-        "msdos": ["-n", label],
-        "exfat": ["-n", label],
-        "f2fs": ["-l", label],
-    }
-    return mapping.get(fs_type, [])
+    return [flag, label]
 
 
 def read_blkid(part_dev):
     result = subprocess.run(
-        ["blkid", "-o", "export", part_dev],
+        [require_tool("blkid"), "-o", "export", part_dev],
         check=False,
         stdout=subprocess.PIPE,
         stderr=subprocess.DEVNULL,
@@ -311,6 +409,11 @@ def main():
         default="",
         help="Extra arguments to pass to mkfs.<fs>",
     )
+    parser.add_argument(
+        "--dense",
+        action="store_true",
+        help="Preallocate the whole image instead of creating a sparse file",
+    )
     parser.add_argument(
         "--force",
         action="store_true",
@@ -345,10 +448,6 @@ def main():
     require_tool("partprobe")
     require_tool(f"mkfs.{args.fs}")
 
-    if args.scheme == "gpt":
-        if not shutil.which("parted"):
-            raise DiskBuildError("GPT requires parted")
-
     if os.path.exists(output_path):
         if args.force:
             os.remove(output_path)
@@ -420,8 +519,7 @@ def main():
     if total_sectors <= args.partition_start:
         raise DiskBuildError("Image size does not allow a partition")
 
-    with open(output_path, "wb") as handle:
-        handle.truncate(image_size)
+    create_image(output_path, image_size, dense=args.dense)
 
     if args.scheme == "mbr":
         partition_mbr(output_path, args.partition_start, total_sectors)
@@ -434,19 +532,10 @@ def main():
     stage1_patched = stage1_patched.ljust(0x1BE, b"\x00")
     write_at(output_path, 0, stage1_patched)
 
-    loop_dev = None
-    mount_dir = None
-    part_dev = None
-
-    try:
-        loop_dev = subprocess.check_output(
-            ["losetup", "--find", "--show", "--partscan", output_path],
-            text=True,
-        ).strip()
-        run_command(["partprobe", loop_dev], stdout=subprocess.DEVNULL)
+    with attached_loop(output_path) as loop_dev:
         part_dev = wait_for_partition(loop_dev)
 
-        mkfs_cmd = [f"mkfs.{args.fs}"]
+        mkfs_cmd = [require_tool(f"mkfs.{args.fs}")]
         mkfs_cmd.extend(mkfs_label_args(args.fs, args.label))
         if args.mkfs_args:
             mkfs_cmd.extend(shlex.split(args.mkfs_args))
@@ -465,25 +554,8 @@ def main():
         stage2_blob, _ = build_stage2_blob(stage2_patched, corefs_bytes)
         write_at(output_path, stage2_start * SECTOR_SIZE, stage2_blob)
 
-        mount_dir = tempfile.mkdtemp(prefix="valecium-img-")
-        run_command(["mount", part_dev, mount_dir])
-        copy_tree_contents(staging_dir, mount_dir)
-        run_command(["sync"])
-        run_command(["umount", mount_dir])
-        shutil.rmtree(mount_dir, ignore_errors=True)
-        mount_dir = None
-    finally:
-        if mount_dir:
-            try:
-                run_command(["umount", mount_dir])
-            except Exception:
-                pass
-            shutil.rmtree(mount_dir, ignore_errors=True)
-        if loop_dev:
-            try:
-                run_command(["losetup", "-d", loop_dev])
-            except Exception:
-                pass
+        with mounted(part_dev) as mount_dir:
+            copy_tree_contents(staging_dir, mount_dir)
 
     print("Disk image written:", output_path)
     print("Stage2 LBA:", stage2_start)
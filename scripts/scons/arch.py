@@ -1,6 +1,8 @@
 # SPDX-License-Identifier: BSD-3-Clause
 
-ArchConfigurations = {
+from types import MappingProxyType
+
+_ArchConfigurations = {
     "i686": {
         "TargetTriple": "i686-linux-musl",
         "ToolchainPrefix": "i686-linux-musl-",
@@ -42,15 +44,31 @@ ArchConfigurations = {
     },
 }
 
+# Read-only views: callers share one instance, so flag lists are frozen to
+# tuples and must be copied (list(...)) before being handed to env.Append
+ArchConfigurations = MappingProxyType(
+    {
+        Name: MappingProxyType(
+            {
+                Key: tuple(Value) if isinstance(Value, list) else Value
+                for Key, Value in Config.items()
+            }
+        )
+        for Name, Config in _ArchConfigurations.items()
+    }
+)
+
+SupportedArchitectures = tuple(ArchConfigurations)
+
 
-def GetArchConfig(Architecture: str) -> dict:
+def GetArchConfig(Architecture: str) -> MappingProxyType:
     if Architecture not in ArchConfigurations:
         raise ValueError(
             f"Unsupported architecture: {Architecture}. "
-            f"Supported: {list(ArchConfigurations.keys())}"
+            f"Supported: {list(SupportedArchitectures)}"
         )
     return ArchConfigurations[Architecture]
 
 
-def GetSupportedArchitectures() -> list:
-    return list(ArchConfigurations.keys())
+def GetSupportedArchitectures() -> tuple:
+    return SupportedArchitectures
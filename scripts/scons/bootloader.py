@@ -84,9 +84,9 @@ def ConfigureBootloaderEnvironment(
     bootloader_config: dict,
 ):
     env.Append(
-        ASFLAGS=architecture_config.get("AssemblyFlags", []),
-        CCFLAGS=architecture_config.get("CompilerFlags", []),
-        LINKFLAGS=architecture_config.get("LinkerFlags", []),
+        ASFLAGS=list(architecture_config.get("AssemblyFlags", ())),
+        CCFLAGS=list(architecture_config.get("CompilerFlags", ())),
+        LINKFLAGS=list(architecture_config.get("LinkerFlags", ())),
     )
 
     env.Append(
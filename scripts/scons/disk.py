@@ -1,11 +1,13 @@
 # SPDX-License-Identifier: BSD-3-Clause
 
+import contextlib
 import os
 import shutil
 import struct
 import subprocess
-import textwrap
+import tempfile
 
+from scripts.disk_builder import get_dir_size
 from scripts.scons.bootloader import (
     CreateElTorito,
     ValidateBootSetup,
@@ -22,6 +24,33 @@ IsoBootCatalogInitialEntryOffset = 0x20
 IsoBootImageSectorCountOffset = 0x06
 IsoBootImageLbaOffset = 0x08
 CoreFsPatchSignature = b"VLSF"
+TmpfsDirectory = "/dev/shm"
+IsoScratchMargin = 64 * 1024 * 1024
+
+GrubConfigTemplate = """\
+# Set a variable to prevent recursion loops
+if [ -z "$configLoaded" ]; then
+    set configLoaded=1
+
+    # Force standard PC keyboard and console output
+    terminal_input console
+    terminal_output console
+
+    set timeout_style=menu
+    set timeout={Timeout}
+    set default=0
+
+    menuentry "Valecium OS" {{
+        search --no-floppy --label {VolumeLabelName} --set=root
+        multiboot /boot/{KernelName} root=LABEL={VolumeLabelName}
+        boot
+    }}
+
+    menuentry "Reboot" {{
+        reboot
+    }}
+fi
+"""
 
 
 def ReadIsoPvdFields(IsoPath: str) -> tuple[bytes, bytes]:
@@ -89,6 +118,69 @@ def RunCommand(Arguments: list, InputText: str = None, **kwargs):
     )
 
 
+def UsesSystemBootloader(BootSystem: str, BootloaderComponents: dict) -> bool:
+    return bool(
+        BootSystem == "system"
+        and BootloaderComponents
+        and BootloaderComponents.get("Stage1")
+        and BootloaderComponents.get("Stage2")
+    )
+
+
+def PrepareIsoBootImage(
+    VolumeLabelName: str = VolumeLabel,
+    BootSystem: str = "grub",
+    BootloaderComponents: dict = None,
+) -> str:
+    """Build the El Torito boot image for the system bootloader.
+
+    Returns the image path, or ``None`` when the ISO is built with GRUB. The
+    image depends only on the bootloader binaries, never on the staging
+    tree, so it can be prepared while staging is still in progress.
+    """
+    if not UsesSystemBootloader(BootSystem, BootloaderComponents):
+        return None
+
+    PartitionLabelBytes = VolumeLabelName.encode("ascii", errors="replace").ljust(
+        32, b" "
+    )[:32]
+    return CreateElTorito(
+        str(BootloaderComponents["Stage1"]),
+        str(BootloaderComponents["Stage2"]),
+        FileSystemType="iso9660",
+        CoreFsBinaries=BootloaderComponents.get("CoreFsBinaries"),
+        PartitionLabel=PartitionLabelBytes,
+    )
+
+
+@contextlib.contextmanager
+def ScratchOutput(OutputPath: str, SourceDirectory: str):
+    """Yield a path to build *OutputPath* at, then move the result into place.
+
+    The scratch file lives on tmpfs when *SourceDirectory*, which the image
+    is built from, fits there with some margin, so the image is not written
+    to the same disk the staging tree is read from; otherwise it sits next
+    to *OutputPath*. Sizing the tree stops as soon as it is known not to
+    fit, and is skipped when tmpfs is unavailable. Nothing is left at
+    *OutputPath* if the build fails.
+    """
+    ScratchParent = os.path.dirname(os.path.abspath(OutputPath))
+    try:
+        Available = shutil.disk_usage(TmpfsDirectory).free - IsoScratchMargin
+    except OSError:
+        Available = 0
+    if Available > 0 and get_dir_size(SourceDirectory, Available) <= Available:
+        ScratchParent = TmpfsDirectory
+
+    ScratchDirectory = tempfile.mkdtemp(prefix="valecium-iso-", dir=ScratchParent)
+    try:
+        ScratchPath = os.path.join(ScratchDirectory, os.path.basename(OutputPath))
+        yield ScratchPath
+        shutil.move(ScratchPath, OutputPath)
+    finally:
+        shutil.rmtree(ScratchDirectory, ignore_errors=True)
+
+
 def CreateBootableIso(
     StagingDirectory: str,
     OutputIso: str,
@@ -97,12 +189,16 @@ def CreateBootableIso(
     BootType: str = "bios",
     BootSystem: str = "grub",
     BootloaderComponents: dict = None,
+    ElToritoPath: str = None,
 ):
     """Create a bootable ISO 9660 image.
 
     When *BootSystem* is ``'system'`` and *BootloaderComponents* provides Stage1
     and Stage2, the system bootloader is embedded via El Torito "no emulation"
     boot using ``xorriso`` directly.  Otherwise ``grub-mkrescue`` is used.
+    *ElToritoPath* may pass in a boot image already built with
+    :func:`PrepareIsoBootImage`; otherwise it is built here. The image is
+    written through :func:`ScratchOutput`.
     """
 
     ValidateBootSetup(
@@ -111,43 +207,26 @@ def CreateBootableIso(
         Bootloader=BootSystem,
     )
 
-    UseSystemBootloader = (
-        BootSystem == "system"
-        and BootloaderComponents
-        and BootloaderComponents.get("Stage1")
-        and BootloaderComponents.get("Stage2")
-    )
-
-    if not UseSystemBootloader:
+    if not UsesSystemBootloader(BootSystem, BootloaderComponents):
         print("   GRUB-MKRESCUE")
-        RunCommand(
-            [
-                "grub-mkrescue",
-                "-o",
-                OutputIso,
-                StagingDirectory,
-                "--",
-                "-volid",
-                VolumeLabelName,
-            ]
-        )
+        with ScratchOutput(OutputIso, StagingDirectory) as IsoPath:
+            RunCommand(
+                [
+                    "grub-mkrescue",
+                    "-o",
+                    IsoPath,
+                    StagingDirectory,
+                    "--",
+                    "-volid",
+                    VolumeLabelName,
+                ]
+            )
         return
 
-    Stage1Path = str(BootloaderComponents["Stage1"])
-    Stage2Path = str(BootloaderComponents["Stage2"])
-
-    PartitionLabelBytes = VolumeLabelName.encode("ascii", errors="replace").ljust(
-        32, b" "
-    )[:32]
-    ElToritoPath = CreateElTorito(
-        Stage1Path,
-        Stage2Path,
-        FileSystemType="iso9660",
-        CoreFsBinaries=BootloaderComponents.get("CoreFsBinaries")
-        if BootloaderComponents
-        else None,
-        PartitionLabel=PartitionLabelBytes,
-    )
+    if ElToritoPath is None:
+        ElToritoPath = PrepareIsoBootImage(
+            VolumeLabelName, BootSystem, BootloaderComponents
+        )
     LoadSectors = (os.path.getsize(ElToritoPath) + 511) // 512
 
     print(
@@ -160,29 +239,30 @@ def CreateBootableIso(
     os.makedirs(os.path.dirname(BootImageInStage), exist_ok=True)
     shutil.copy2(ElToritoPath, BootImageInStage)
 
-    RunCommand(
-        [
-            "xorriso",
-            "-as",
-            "mkisofs",
-            "-o",
-            OutputIso,
-            "-b",
-            os.path.relpath(BootImageInStage, StagingDirectory),
-            "-no-emul-boot",
-            "-boot-load-size",
-            str(LoadSectors),
-            "-boot-info-table",
-            "-volid",
-            VolumeLabelName,
-            StagingDirectory,
-        ],
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-    )
+    with ScratchOutput(OutputIso, StagingDirectory) as IsoPath:
+        RunCommand(
+            [
+                "xorriso",
+                "-as",
+                "mkisofs",
+                "-o",
+                IsoPath,
+                "-b",
+                os.path.relpath(BootImageInStage, StagingDirectory),
+                "-no-emul-boot",
+                "-boot-load-size",
+                str(LoadSectors),
+                "-boot-info-table",
+                "-volid",
+                VolumeLabelName,
+                StagingDirectory,
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
 
-    PartitionLabel, PartitionUuid = ReadIsoPvdFields(OutputIso)
-    PatchIsoBootImageCoreFs(OutputIso, PartitionLabel, PartitionUuid)
+        PartitionLabel, PartitionUuid = ReadIsoPvdFields(IsoPath)
+        PatchIsoBootImageCoreFs(IsoPath, PartitionLabel, PartitionUuid)
 
 
 def BuildGrubConfigContent(
@@ -192,30 +272,9 @@ def BuildGrubConfigContent(
 ) -> str:
     Timeout = "0" if Config == "debug" else "10"
 
-    return textwrap.dedent(f"""\
-# Set a variable to prevent recursion loops
-if [ -z "$configLoaded" ]; then
-    set configLoaded=1
-
-    # Force standard PC keyboard and console output
-    terminal_input console
-    terminal_output console
-
-    set timeout_style=menu
-    set timeout={Timeout}
-    set default=0
-
-    menuentry "Valecium OS" {{
-        search --no-floppy --label {VolumeLabelName} --set=root
-        multiboot /boot/{KernelName} root=LABEL={VolumeLabelName}
-        boot
-    }}
-
-    menuentry "Reboot" {{
-        reboot
-    }}
-fi
-""")
+    return GrubConfigTemplate.format(
+        Timeout=Timeout, KernelName=KernelName, VolumeLabelName=VolumeLabelName
+    )
 
 
 def GenerateGrubConfig(
@@ -227,6 +286,9 @@ def GenerateGrubConfig(
     os.makedirs(GrubDirectory, exist_ok=True)
     ConfigPath = os.path.join(GrubDirectory, "grub.cfg")
     Content = BuildGrubConfigContent(Config, KernelName, VolumeLabelName)
-    with open(ConfigPath, "w", encoding="utf-8") as FileHandle:
-        FileHandle.write(Content)
+
+    # Encoded once and written in binary mode, skipping the text layer; the
+    # buffered writer retries short writes, which a bare os.write would not
+    with open(ConfigPath, "wb") as FileHandle:
+        FileHandle.write(Content.encode("utf-8"))
     return ConfigPath
@@ -1,86 +1,266 @@
 # SPDX-License-Identifier: BSD-3-Clause
 
-from decimal import Decimal
-import re
+import fnmatch
 import os
+import re
+import sys
 
-from SCons.Node.FS import Dir, File, Entry
+from SCons.Node.FS import Base, Dir
 from SCons.Environment import Environment
 
+SizeMultipliers = {
+    "k": 1024,
+    "K": 1024,
+    "m": 1024**2,
+    "M": 1024**2,
+    "g": 1024**3,
+    "G": 1024**3,
+}
+
+# Only consulted for sizes the fast paths in ParseSize reject. It must match
+# the whole string, so typos such as "1.2.3" or "3Kb" are errors rather
+# than being truncated to a leading number.
+SizePattern = re.compile(r"([0-9]+(?:\.[0-9]*)?|\.[0-9]+)([kmgKMG]?)")
+
+SourceExtensions = frozenset(("c", "cpp", "S"))
+
+# Source directory paths keyed on the environment, the SConscript directory
+# that relative nodes resolve against, and the node itself. Environments are
+# not re-pointed at other source trees once cloned, so entries live for the
+# whole build.
+SrcnodePaths = {}
+
+# GlobSources results keyed on (absolute srcpath, extensions), each stored
+# with the mtime of every directory the walk read
+GlobSourcesCache = {}
+
 
 def ParseSize(size: str) -> int:
-    SizeMatch = re.match(r"([0-9\.]+)([kmg]?)", size, re.IGNORECASE)
+    # isdigit() alone also accepts non-ASCII digits such as "١٢"
+    if size.isascii() and size.isdigit():
+        return int(size)
+
+    Multiplier = SizeMultipliers.get(size[-1:])
+    Number = size[:-1] if Multiplier else size
+    # Whole numbers such as "512m" are the usual case and skip float()
+    if Multiplier and Number.isascii() and Number.isdigit():
+        return int(Number) * Multiplier
+
+    # Fractional sizes; the pattern also keeps float() from accepting
+    # exponents, padding, "inf" or "nan"
+    SizeMatch = SizePattern.fullmatch(size)
     if SizeMatch is None:
         raise ValueError(f"Error: Invalid size {size}")
 
-    Result = Decimal(SizeMatch.group(1))
-    Multiplier = SizeMatch.group(2).lower()
+    Result = float(SizeMatch.group(1))
+    return int(Result * SizeMultipliers.get(SizeMatch.group(2), 1))
 
-    Multipliers = {"k": 1024, "m": 1024**2, "g": 1024**3}
-    if Multiplier in Multipliers:
-        Result *= Multipliers[Multiplier]
 
-    return int(Result)
+def SrcnodePath(env: Environment, node: str) -> str:
+    Key = (id(env), env.fs.getcwd(), node)
+    Path = SrcnodePaths.get(Key)
+    if Path is None:
+        Path = SrcnodePaths[Key] = str(env.Dir(node).srcnode())
+    return Path
 
 
-def GlobRecursive(env: Environment, pattern: str, node: str = ".") -> list:
-    Source = str(env.Dir(node).srcnode())
-    WorkingDirectory = str(env.Dir(".").srcnode())
-
-    DirectoryList = [Source]
-    for Root, Directories, _ in os.walk(Source):
-        for Directory in Directories:
-            DirectoryList.append(os.path.join(Root, Directory))
-
-    GlobResults = []
-    for Directory in DirectoryList:
-        Matched = env.Glob(
-            os.path.join(os.path.relpath(Directory, WorkingDirectory), pattern)
-        )
+def IterGlobRecursive(env: Environment, pattern: str, node: str = "."):
+    """Yield the matches of *pattern* in every directory under *node*.
+
+    Follows env.Glob's rules within each directory: entries are matched by
+    name, sorted, and dotfiles are skipped unless the pattern starts with
+    ``.``; matching directories are returned as Dir nodes. Each directory
+    is read once by the walk itself rather than again through env.Glob,
+    and directories are visited depth-first in name order. Unlike env.Glob,
+    only entries that exist on disk are returned. Matches are yielded as
+    each directory is read, so the walk can be consumed lazily; nodes are
+    resolved against the SConscript directory current at the time of the
+    call, not at the time they are consumed. *pattern* is matched against
+    entry names, so it cannot contain a path separator; pass the directory
+    as *node* instead.
+    """
+    if "/" in pattern or os.sep in pattern:
+        raise ValueError(f"Error: Glob pattern {pattern} must not contain a path")
+
+    return WalkGlobMatches(
+        env,
+        pattern,
+        SrcnodePath(env, node),
+        SrcnodePath(env, "."),
+        env.fs.getcwd(),
+    )
+
+
+def WalkGlobMatches(
+    env: Environment,
+    pattern: str,
+    Source: str,
+    WorkingDirectory: str,
+    WorkingNode: Dir,
+):
+    MatchHidden = pattern.startswith(".")
+    Stack = [Source]
+    while Stack:
+        Directory = Stack.pop()
         try:
-            GlobResults.extend(list(Matched))
-        except TypeError:
-            GlobResults.append(Matched)
+            with os.scandir(Directory) as Iterator:
+                Entries = {Entry.name: Entry for Entry in Iterator}
+        except OSError:
+            continue
+
+        # relpath never ends in a separator, so joining is a concatenation
+        RelativeRoot = sys.intern(os.path.relpath(Directory, WorkingDirectory) + os.sep)
+        for Name in sorted(fnmatch.filter(Entries, pattern)):
+            if Name[0] == "." and not MatchHidden:
+                continue
+            Path = RelativeRoot + Name
+            if Entries[Name].is_dir():
+                yield env.Dir(Path, WorkingNode)
+            else:
+                yield env.File(Path, WorkingNode)
+
+        # Pushed in reverse so subdirectories are popped in name order;
+        # symlinked directories are matched above but not descended into
+        Stack.extend(
+            sorted(
+                (
+                    Entry.path
+                    for Entry in Entries.values()
+                    if Entry.is_dir() and not Entry.is_symlink()
+                ),
+                reverse=True,
+            )
+        )
 
-    return GlobResults
+
+def GlobRecursive(env: Environment, pattern: str, node: str = ".") -> list:
+    """Return the matches of IterGlobRecursive as a list."""
+    return list(IterGlobRecursive(env, pattern, node))
 
 
-def GlobSources(srcpath: str, extensions: tuple = (".c", ".cpp", ".S")) -> list:
+def WalkSources(srcpath: str, Extensions: frozenset) -> tuple:
     Sources = []
-    for Root, _Directories, Files in os.walk(srcpath):
-        for FileName in Files:
-            if FileName.endswith(extensions):
-                FullPath = os.path.join(Root, FileName)
-                RelativePath = os.path.relpath(FullPath, srcpath)
-                Sources.append(RelativePath)
-    return Sources
+    Fingerprint = []
+    # Each directory carries its path relative to srcpath as a prefix ending
+    # in a separator (empty for srcpath itself), so matches are plain
+    # concatenations instead of os.path.relpath or os.path.join calls. The
+    # prefixes are interned, as the same ones come back on every walk of the
+    # tree; file paths are not, since each is seen only once.
+    Stack = [(srcpath, "")]
+    while Stack:
+        Directory, Prefix = Stack.pop()
+        Subdirectories = []
+        # Taken before reading so a change made mid-walk still shows up as a
+        # stale fingerprint on the next call; a directory that cannot be
+        # stat'ed is recorded as None so it is noticed once it appears
+        Fingerprint.append((Directory, DirectoryMtime(Directory)))
+        try:
+            with os.scandir(Directory) as Iterator:
+                for Entry in Iterator:
+                    if Entry.is_dir():
+                        if not Entry.is_symlink():
+                            Subdirectories.append(
+                                (
+                                    Entry.path,
+                                    sys.intern(Prefix + Entry.name + os.sep),
+                                )
+                            )
+                    else:
+                        _, Dot, Extension = Entry.name.rpartition(".")
+                        if Dot and Extension in Extensions:
+                            Sources.append(Prefix + Entry.name)
+        except OSError:
+            continue
+        # Reversed so subdirectories are visited in the order os.walk used
+        Stack.extend(reversed(Subdirectories))
+    return Sources, tuple(Fingerprint)
+
+
+def DirectoryMtime(Directory: str) -> int:
+    try:
+        return os.stat(Directory).st_mtime_ns
+    except OSError:
+        return None
+
+
+def FingerprintMatches(Fingerprint: tuple) -> bool:
+    return all(DirectoryMtime(Directory) == Mtime for Directory, Mtime in Fingerprint)
+
+
+def GlobSources(srcpath: str, extensions: tuple = None) -> list:
+    # Extensions are matched on the text after the last dot, so each file
+    # costs one set lookup rather than a suffix test per extension. The match
+    # is case-sensitive: ".S" is assembly run through the C preprocessor,
+    # while plain ".s" files are not picked up unless asked for.
+    if extensions is None:
+        Extensions = SourceExtensions
+    else:
+        Extensions = frozenset(Extension.lstrip(".") for Extension in extensions)
+
+    # A directory's mtime changes whenever an entry is added, removed or
+    # renamed in it, so re-stating every walked directory is enough to tell
+    # whether a cached list is still accurate without reading them again
+    Key = (os.path.abspath(srcpath), Extensions)
+    Cached = GlobSourcesCache.get(Key)
+    if Cached is not None and FingerprintMatches(Cached[0]):
+        return list(Cached[1])
+
+    Sources, Fingerprint = WalkSources(srcpath, Extensions)
+    GlobSourcesCache[Key] = (Fingerprint, Sources)
+    return list(Sources)
 
 
 def FindIndex(TheList: list, Predicate) -> int:
-    for Index, Item in enumerate(TheList):
-        if Predicate(Item):
-            return Index
-    return None
+    return next((Index for Index, Item in enumerate(TheList) if Predicate(Item)), None)
+
+
+def FindIndexByName(TheList: list, Name: str) -> int:
+    # Nodes are compared by their name and strings as-is; list.index does the
+    # scan in C instead of calling a predicate per item
+    Names = [getattr(Item, "name", Item) for Item in TheList]
+    try:
+        return Names.index(Name)
+    except ValueError:
+        return None
 
 
 def IsFileName(obj, name: str) -> bool:
-    if isinstance(obj, str):
-        return name in obj
-    elif isinstance(obj, (File, Dir, Entry)):
+    # Dir, File and Entry all derive from Base. Paths compare on their last
+    # component, matching how nodes compare on their name.
+    if isinstance(obj, Base):
         return obj.name == name
+    elif isinstance(obj, str):
+        return os.path.basename(obj) == name
+    return False
+
+
+def FileNameContains(obj, name: str) -> bool:
+    if isinstance(obj, Base):
+        return name in obj.name
+    elif isinstance(obj, str):
+        return name in obj
     return False
 
 
 def RemoveSuffix(s: str, suffix: str) -> str:
-    if s.endswith(suffix):
-        return s[: -len(suffix)]
-    return s
+    return s.removesuffix(suffix)
 
 
 def CreateBuildEnv(
-    BaseEnvironment: Environment, srcpath: str, **KeywordArgs
+    BaseEnvironment: Environment, srcpath: str, Clone: bool = True, **KeywordArgs
 ) -> Environment:
-    EnvironmentObject = BaseEnvironment.Clone()
+    if Clone:
+        EnvironmentObject = BaseEnvironment.Clone()
+    else:
+        # An override layer over the base instead of a full copy; Append on it
+        # writes into the layer, so the base environment is left untouched.
+        # Later changes to the base still show through the layer.
+        EnvironmentObject = BaseEnvironment.Override(
+            {
+                "CPATH": BaseEnvironment.get("CPATH", []),
+                "CPPPATH": BaseEnvironment.get("CPPPATH", []),
+            }
+        )
 
     EnvironmentObject.Append(
         CPATH=[srcpath],
@@ -0,0 +1,74 @@
+# SPDX-License-Identifier: BSD-3-Clause
+"""
+Tests for the toolchain builder's install cache and manifests.
+
+Run from the repository root with: python3 -m unittest scripts.tests.test_toolchain
+"""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from scripts.base import toolchain
+
+
+class CachedInstallTest(unittest.TestCase):
+    """Install a fake build step through _cached_install()."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+
+        self.saved_cache = toolchain.INSTALL_CACHE
+        toolchain.INSTALL_CACHE = root / "cache"
+
+        self.builder = toolchain.ToolchainBuilder(
+            str(root / "prefix"), "i686-linux-musl", jobs=2, use_ccache=False
+        )
+        self.builder.setup_directories()
+        self.prefix = self.builder.prefix
+        self.builds = 0
+
+    def tearDown(self):
+        toolchain.INSTALL_CACHE = self.saved_cache
+        self.tmp.cleanup()
+
+    def install(self, destdir: Path) -> Path:
+        """Stage a tree with a gcc-style lib -> lib64 directory symlink."""
+        self.builds += 1
+        tree = self.builder._prefix_in(destdir)
+        (tree / "lib64").mkdir(parents=True)
+        (tree / "lib64" / "libfoo.a").write_text("archive\n")
+        os.symlink("lib64", tree / "lib")
+        return tree
+
+    def run_install(self):
+        self.builder._cached_install("step", "k" * 64, self.prefix, self.install)
+
+    def test_directory_symlink_is_recorded(self):
+        self.run_install()
+        entries = toolchain.tree_entries(self.prefix, 2)
+        self.assertEqual(entries["lib"], {"link": "lib64"})
+        self.assertTrue(self.builder._verify_manifest("step", "k" * 64))
+
+    def test_repointed_directory_symlink_fails_verification(self):
+        self.run_install()
+        (self.prefix / "lib").unlink()
+        (self.prefix / "other").mkdir()
+        os.symlink("other", self.prefix / "lib")
+        self.assertFalse(self.builder._verify_manifest("step", "k" * 64))
+
+    def test_missing_directory_symlink_is_republished(self):
+        self.run_install()
+        (self.prefix / "lib").unlink()
+        self.assertFalse(self.builder._verify_manifest("step", "k" * 64))
+
+        self.run_install()
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(os.readlink(self.prefix / "lib"), "lib64")
+        self.assertTrue(self.builder._verify_manifest("step", "k" * 64))
+
+
+if __name__ == "__main__":
+    unittest.main()